@@ -0,0 +1,190 @@
+import os.path as osp
+import sys
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+ort = pytest.importorskip('onnxruntime')
+onnx = pytest.importorskip('onnx')
+
+if int(tf.__version__.split('.')[0]) >= 2:
+    # tools/onnx_tf targets Tensorflow 1.x graphs (tf.placeholder/Session).
+    pytest.skip('onnx_tf backend needs Tensorflow 1.x',
+                allow_module_level=True)
+
+sys.path.insert(
+    0, osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))), 'tools'))
+
+from onnx import TensorProto, helper, numpy_helper  # noqa: E402
+
+from onnx_tf.backend import prepare  # noqa: E402
+
+OPSET = 11
+
+
+def make_conv_model(op, x_shape, w, b=None, const_w=True, dyn=None,
+                    **attrs):
+    """Build a single Conv/ConvTranspose ONNX model.
+
+    ``dyn`` lists the input axes that are declared dynamic.
+    """
+    x_dims = [
+        'd{}'.format(i) if dyn and i in dyn else d
+        for i, d in enumerate(x_shape)
+    ]
+    inputs = [helper.make_tensor_value_info('x', TensorProto.FLOAT, x_dims)]
+    initializers = []
+    names = ['x', 'w']
+    if const_w:
+        initializers.append(numpy_helper.from_array(w, 'w'))
+    else:
+        inputs.append(
+            helper.make_tensor_value_info('w', TensorProto.FLOAT, w.shape))
+    if b is not None:
+        initializers.append(numpy_helper.from_array(b, 'b'))
+        names.append('b')
+    node = helper.make_node(op, names, ['y'], **attrs)
+    graph = helper.make_graph(
+        [node], 'conv', inputs,
+        [
+            helper.make_tensor_value_info(
+                'y', TensorProto.FLOAT,
+                ['y{}'.format(i) for i in range(len(x_shape))])
+        ],
+        initializer=initializers)
+    model = helper.make_model(
+        graph, opset_imports=[helper.make_opsetid('', OPSET)])
+    model.ir_version = 6
+    return model
+
+
+def run_onnxruntime(model, feeds):
+    sess = ort.InferenceSession(model.SerializeToString())
+    return sess.run(None, feeds)[0]
+
+
+def check_conv(op, x_shape, w_shape, bias=False, const_w=True, dyn=None,
+               **attrs):
+    rng = np.random.RandomState(0)
+    x = rng.randn(*x_shape).astype(np.float32)
+    w = rng.randn(*w_shape).astype(np.float32)
+    out_channels = w_shape[0] if op == 'Conv' else \
+        w_shape[1] * attrs.get('group', 1)
+    b = rng.randn(out_channels).astype(np.float32) if bias else None
+    model = make_conv_model(op, x_shape, w, b, const_w, dyn, **attrs)
+    feeds = {'x': x} if const_w else {'x': x, 'w': w}
+
+    expected = run_onnxruntime(model, feeds)
+    tf_rep = prepare(model, logging_level='ERROR')
+    result = tf_rep.run(feeds)['y']
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize('dyn', [None, (0, 2, 3)])
+@pytest.mark.parametrize('x_shape,w_shape,attrs', [
+    # odd kernel, stride 1 and 2, even and odd input sizes
+    ((2, 4, 9, 9), (6, 4, 3, 3), {}),
+    ((2, 4, 9, 9), (6, 4, 3, 3), dict(strides=[2, 2])),
+    ((2, 4, 10, 10), (6, 4, 3, 3), dict(strides=[2, 2])),
+    # even kernel, total pad 3 puts 2 at the beginning
+    ((2, 4, 8, 8), (6, 4, 4, 4), {}),
+    # 2x2 kernel with stride 3: no pad on 8x8, one leading pad on 7x7
+    ((2, 4, 8, 8), (6, 4, 2, 2), dict(strides=[3, 3])),
+    ((2, 4, 7, 7), (6, 4, 2, 2), dict(strides=[3, 3])),
+    # mixed per-axis pads
+    ((2, 4, 8, 9), (6, 4, 4, 3), dict(strides=[2, 1])),
+    ((2, 4, 8, 8), (8, 1, 4, 4), dict(group=4)),
+])
+def test_conv_same_lower(x_shape, w_shape, attrs, dyn):
+    check_conv('Conv', x_shape, w_shape, bias=True, dyn=dyn,
+               auto_pad='SAME_LOWER', **attrs)
+
+
+def test_conv1d_same_lower():
+    check_conv('Conv', (2, 4, 9), (6, 4, 4), auto_pad='SAME_LOWER')
+    check_conv('Conv', (2, 4, 9), (6, 4, 4), dyn=(0, 2),
+               auto_pad='SAME_LOWER')
+
+
+@pytest.mark.parametrize('multiplier', [1, 2, 3])
+@pytest.mark.parametrize('attrs', [
+    dict(pads=[1, 1, 1, 1]),
+    dict(pads=[0, 1, 1, 0], strides=[2, 2]),
+    dict(strides=[2, 1]),
+    dict(dilations=[2, 2]),
+    dict(dilations=[2, 1], pads=[1, 1, 1, 1]),
+    dict(auto_pad='SAME_LOWER', strides=[2, 2]),
+    dict(auto_pad='SAME_UPPER'),
+])
+def test_conv_depthwise(multiplier, attrs):
+    w_shape = (4 * multiplier, 1, 3, 3)
+    check_conv('Conv', (2, 4, 9, 9), w_shape, bias=True, group=4, **attrs)
+    check_conv('Conv', (2, 4, 9, 9), w_shape, dyn=(0, ), group=4, **attrs)
+
+
+@pytest.mark.parametrize('bias', [False, True])
+@pytest.mark.parametrize('const_w', [True, False])
+@pytest.mark.parametrize('x_shape,w_shape,attrs', [
+    ((2, 4, 9, 9), (6, 2, 3, 3), dict(group=2)),
+    ((2, 4, 9, 9), (6, 2, 3, 3),
+     dict(group=2, pads=[1, 0, 2, 1], strides=[2, 2])),
+    ((2, 4, 9, 9), (8, 2, 3, 3), dict(group=2, dilations=[2, 1])),
+    ((2, 4, 9), (6, 2, 3), dict(group=2, pads=[1, 1])),
+    ((2, 4, 5, 6, 7), (6, 2, 3, 3, 3), dict(group=2)),
+])
+def test_conv_grouped(x_shape, w_shape, attrs, bias, const_w):
+    check_conv('Conv', x_shape, w_shape, bias=bias, const_w=const_w,
+               **attrs)
+
+
+@pytest.mark.parametrize('bias', [False, True])
+@pytest.mark.parametrize('x_shape,w_shape,attrs', [
+    ((2, 4, 9, 9), (6, 4, 3, 3), {}),
+    ((2, 4, 9, 9), (6, 4, 3, 3), dict(pads=[1, 0, 2, 1], strides=[2, 2])),
+    ((2, 4, 9, 9), (6, 4, 3, 3), dict(auto_pad='SAME_UPPER')),
+    ((2, 4, 9), (6, 4, 3), dict(pads=[1, 1])),
+    ((2, 4, 5, 6, 7), (6, 4, 3, 3, 3), dict(pads=[1, 1, 1, 1, 1, 1])),
+])
+def test_conv(x_shape, w_shape, attrs, bias):
+    check_conv('Conv', x_shape, w_shape, bias=bias, **attrs)
+    check_conv('Conv', x_shape, w_shape, bias=bias, dyn=(0, ), **attrs)
+
+
+@pytest.mark.parametrize('dyn', [None, (0, )])
+@pytest.mark.parametrize('x_shape,w_shape,attrs', [
+    ((2, 4, 5, 5), (4, 3, 3, 3), {}),
+    ((2, 4, 5, 5), (4, 3, 3, 3),
+     dict(strides=[2, 2], pads=[1, 1, 1, 1], output_padding=[1, 1])),
+    ((2, 4, 5, 5), (4, 3, 3, 3), dict(strides=[2, 2], auto_pad='VALID')),
+    ((2, 4, 5, 5), (4, 3, 3, 3), dict(group=2, strides=[2, 2])),
+    ((2, 4, 5), (4, 3, 3), dict(strides=[2])),
+])
+def test_conv_transpose(x_shape, w_shape, attrs, dyn):
+    if len(x_shape) == 3 and not hasattr(tf.contrib.nn, 'conv1d_transpose'):
+        pytest.skip('tf.contrib.nn.conv1d_transpose needs Tensorflow 1.5+')
+    check_conv('ConvTranspose', x_shape, w_shape, bias=True, dyn=dyn,
+               **attrs)
+
+
+def test_export_graph_keeps_inputs(tmpdir):
+    # 'unused' reaches no output, it must still be fed by name.
+    w = np.ones((6, 4, 3, 3), dtype=np.float32)
+    model = make_conv_model('Conv', (1, 4, 9, 9), w)
+    model.graph.input.extend([
+        helper.make_tensor_value_info('unused', TensorProto.FLOAT, [1])
+    ])
+    tf_rep = prepare(model, logging_level='ERROR')
+    path = str(tmpdir.join('conv.pb'))
+    tf_rep.export_graph(path)
+
+    graph_def = tf.GraphDef()
+    with open(path, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+    node_names = [n.name for n in graph_def.node]
+    assert 'x' in node_names
+    assert 'unused' in node_names
+    # the original initializer is pruned, only the folded copy is kept
+    assert 'w' not in node_names
+    assert 'w_transposed' in node_names
@@ -6,6 +6,8 @@ from __future__ import unicode_literals
 import tensorflow as tf
 
 from onnx.backend.base import BackendRep, namedtupledict
+import onnx_tf.common as common
+from onnx_tf.handlers.backend.conv_mixin import ONEDNN_ENABLED
 
 
 class TensorflowRep(BackendRep):
@@ -95,6 +97,10 @@ class TensorflowRep(BackendRep):
 
     :returns: none.
     """
+    if ONEDNN_ENABLED:
+      common.logger.warning(
+          "ONNX_TF_ONEDNN_NCHW=1: convs are exported as NCHW CPU ops, "
+          "which only oneDNN (MKL) Tensorflow builds can run.")
     graph_proto = self.graph.as_graph_def()
     # rename the output nodes
     meaningful_names = {}
@@ -110,6 +116,16 @@ class TensorflowRep(BackendRep):
     print(f"=> new_outputs: {new_outputs}")
     print("==============================================================================\n")
 
+    # Drop nodes that no output depends on, e.g. weight initializers
+    # that conv handlers replaced with pre-transposed constants.
+    # extract_sub_graph takes op names, outputs may be ":1" etc. tensors.
+    # Inputs are kept even if no output uses them, so they can still be fed.
+    dest_ops = [
+        self.tensor_dict[output_name].name.split(':')[0]
+        for output_name in self.outputs
+    ] + [self.tensor_dict[input_name].op.name for input_name in self.inputs]
+    graph_proto = tf.graph_util.extract_sub_graph(graph_proto, dest_ops)
+
     with open(path, "wb") as fout:
       fout.write(graph_proto.SerializeToString())
 
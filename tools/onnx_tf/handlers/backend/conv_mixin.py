@@ -1,4 +1,9 @@
+import functools
+import os
+
+import numpy as np
 import tensorflow as tf
+from tensorflow.python.framework import tensor_util
 
 from onnx_tf.common import get_data_format
 from onnx_tf.common import get_perm_from_formats
@@ -11,9 +16,170 @@ from .pad_mixin import PadMixin
 # is not natively supported in Tensorflow.
 PAD_TF_INCOMPATIBLE = "PAD_TF_INCOMPATIBLE"
 
+# tf.nn.conv2d accepts grouped filters (in_channels / group input depth)
+# natively since Tensorflow 2.3. The backend itself still needs Tensorflow
+# 1.x (tf.placeholder, tf.Session), so this is always False on supported
+# versions and grouped convs use the split path; kept for a Tensorflow 2 port.
+_TF_VERSION = tuple(int(v) for v in tf.__version__.split(".")[:2])
+GROUPED_CONV2D_SUPPORTED = _TF_VERSION >= (2, 3)
+
+
+def _onednn_enabled():
+  # Opt in only: the graph then holds NCHW CPU convs, which stock
+  # Tensorflow cannot run. Keep it off for graphs written by export_graph.
+  if os.environ.get("ONNX_TF_ONEDNN_NCHW") != "1":
+    return False
+  # Ask the loaded Tensorflow build, on Tensorflow 2.x this also honors
+  # TF_ENABLE_ONEDNN_OPTS. Builds without the check have no oneDNN.
+  try:
+    from tensorflow.python.util import _pywrap_util_port
+    return bool(_pywrap_util_port.IsMklEnabled())
+  except (ImportError, AttributeError):
+    pass
+  try:
+    from tensorflow.python import pywrap_tensorflow
+    return bool(pywrap_tensorflow.IsMklEnabled())
+  except (ImportError, AttributeError):
+    return False
+
+
+# oneDNN (TF-MKL) CPU kernels take NCHW directly and reorder it into their
+# blocked layouts internally, so with ONNX_TF_ONEDNN_NCHW=1 on a oneDNN
+# build convs keep the storage format instead of transposing to NHWC and
+# back. Meant for graphs run in process, e.g. TensorflowRep.run.
+ONEDNN_ENABLED = _onednn_enabled()
+
+
+@functools.lru_cache(maxsize=32)
+def _perm(from_, to_):
+  return tuple(get_perm_from_formats(from_, to_))
+
+
+@functools.lru_cache(maxsize=8)
+def _data_format(x_rank):
+  """ Cached get_data_format, plus compute format channel index and
+  spatial axis indices.
+  """
+  storage_format, compute_format = get_data_format(x_rank)
+  if ONEDNN_ENABLED:
+    compute_format = storage_format
+  spatial_axes = tuple(
+      i for i, d in enumerate(compute_format) if d not in ["N", "C"])
+  return (storage_format, compute_format, compute_format.find("C"),
+          spatial_axes)
+
+
+@functools.lru_cache(maxsize=32)
+def _full_rank(values, c_idx):
+  """ Expand per spatial axis strides/dilations to input rank, with 1 for
+  the batch and channel axes.
+  """
+  values = [1] + list(values)
+  values.insert(c_idx, 1)
+  return tuple(values)
+
+
+@functools.lru_cache(maxsize=1)
+def _supports_cuda():
+  # Listing local devices is expensive, do it once per process.
+  return supports_device("CUDA")
+
 
 class ConvMixin(BroadcastMixin):
 
+  @classmethod
+  def _transpose_weights(cls, in_weights, perm, shape=None):
+    """ Transpose conv weights into TF filter layout, optionally reshaped.
+    Constant weights (ONNX initializers) are permuted once in numpy and
+    embedded as a new constant, so no Transpose op is left in the graph.
+    The source initializer stays in the in-memory graph until export_graph
+    prunes it, so run() holds both copies.
+    """
+    const_value = tensor_util.constant_value(in_weights)
+    if const_value is None:
+      weights = tf.transpose(in_weights, perm)
+      if shape is not None:
+        weights = tf.reshape(weights, shape)
+      return weights
+
+    weights = np.transpose(const_value, perm)
+    if shape is not None:
+      weights = np.reshape(weights, shape)
+    return tf.constant(weights, name=in_weights.op.name + "_transposed")
+
+  @classmethod
+  def _convolution(cls, x, weights, pad_mode, strides, dilations,
+                   compute_format):
+    """ Forward convolution in compute format.
+    tf.nn.convolution is a generic N-D dispatcher, undilated 2D convs call
+    conv2d directly. Dilated ones stay on tf.nn.convolution, conv2d only
+    takes dilations since Tensorflow 1.5.
+    """
+    if len(strides) == 2 and not any(d != 1 for d in dilations):
+      return tf.nn.conv2d(
+          x,
+          weights,
+          _full_rank(tuple(strides), compute_format.find("C")),
+          pad_mode,
+          data_format=compute_format)
+    return tf.nn.convolution(
+        x,
+        weights,
+        pad_mode,
+        strides=strides,
+        dilation_rate=dilations,
+        data_format=compute_format)
+
+  @classmethod
+  def _add_bias(cls, output, bias, compute_format):
+    """ Add per-channel bias to conv output.
+    A 1D bias already broadcasts along the last axis, so channel last
+    outputs of any rank use bias_add as is. Channel first bias_add only
+    takes 4D NCHW, other ranks fall back to explicit broadcast + add.
+    """
+    compute_c_idx = compute_format.find("C")
+    if compute_c_idx == len(compute_format) - 1:
+      return tf.nn.bias_add(output, bias)
+    if compute_format == "NCHW":
+      return tf.nn.bias_add(output, bias, data_format=compute_format)
+    bias = cls.explicit_broadcast([output, bias], compute_c_idx)
+    return tf.add(output, bias)
+
+  @classmethod
+  def _pad_same_lower(cls, x, x_spatial_shape, spatial_axes, kernel_shape,
+                      strides, dilations):
+    """ Explicitly pad x for auto_pad SAME_LOWER.
+    Same total pad as TF "SAME", but an odd pad goes to the beginning
+    instead of the end. Returns x unpadded when every total pad is even,
+    so that "SAME" can be used as is.
+
+    :return: Padded x and whether the returned x needs "VALID" padding.
+    """
+    paddings = np.zeros((len(x.get_shape()), 2), dtype=np.int32)
+    dynamic = []
+    for i, axis in enumerate(spatial_axes):
+      k = (kernel_shape[i] - 1) * dilations[i] + 1
+      s = strides[i]
+      in_size = x_spatial_shape[i]
+      if in_size is None:
+        dynamic.append((i, axis, k, s))
+        continue
+      total = max((-(-in_size // s) - 1) * s + k - in_size, 0)
+      paddings[axis] = [total - total // 2, total // 2]
+
+    if not dynamic:
+      if not (paddings[:, 0] != paddings[:, 1]).any():
+        return x, False
+      return tf.pad(x, paddings), True
+
+    x_dyn_shape = tf.shape(x)
+    paddings = tf.unstack(tf.constant(paddings))
+    for i, axis, k, s in dynamic:
+      in_size = x_dyn_shape[axis]
+      total = tf.maximum(((in_size + s - 1) // s - 1) * s + k - in_size, 0)
+      paddings[axis] = tf.stack([total - total // 2, total // 2])
+    return tf.pad(x, tf.stack(paddings)), True
+
   @classmethod
   def conv(cls, node, input_dict, transpose=False):
     """ Convolution method for both conv and transposed conv
@@ -26,17 +192,17 @@ class ConvMixin(BroadcastMixin):
         conv_transpose_output_shape[i] = strides[i] * (input_shape[i] - 1) + kernel_shape[i]
     """
     x = input_dict[node.inputs[0]]
-    x_rank = len(x.get_shape())
     x_shape = x.get_shape().as_list()
+    x_rank = len(x_shape)
     spatial_size = x_rank - 2
 
-    support_cuda = supports_device("CUDA")
-    storage_format, compute_format = get_data_format(x_rank)
-    compute_c_idx = compute_format.find("C")
-    spatial_format = "".join([d for d in compute_format if d not in ["N", "C"]])
+    support_cuda = _supports_cuda()
+    storage_format, compute_format, compute_c_idx, spatial_axes = (
+        _data_format(x_rank))
 
     in_weights = input_dict[node.inputs[1]]
-    weights_rank = len(in_weights.get_shape())
+    w_shape = in_weights.get_shape().as_list()
+    weights_rank = len(w_shape)
     if transpose:
       # Translate weights from (C x M x KH x KW) to (KH x KW X M X C)
       perm = list(range(2, weights_rank)) + [1, 0]
@@ -46,42 +212,68 @@ class ConvMixin(BroadcastMixin):
 
     if "kernel_shape" in node.attrs.keys():
       kernel_shape = node.attrs["kernel_shape"]
-      assert in_weights.get_shape().as_list()[2:] == kernel_shape, (
+      assert w_shape[2:] == kernel_shape, (
           "kernel_shape "
           "attr of convolution does not match the actual weight "
           "passed to this operation, attr {}, actual {}").format(
               kernel_shape,
-              in_weights.get_shape().as_list())
+              w_shape)
     else:
-      kernel_shape = in_weights.get_shape().as_list()[2:]
+      kernel_shape = w_shape[2:]
 
-    weights = tf.transpose(in_weights, perm)
     dilations = node.attrs.get("dilations", [1] * spatial_size)
     strides = node.attrs.get("strides", [1] * spatial_size)
+    dilated = any(d != 1 for d in dilations)
+    strided = any(s != 1 for s in strides)
+    group = node.attrs.get("group", 1)
+
+    # One filter per input channel maps onto a native depthwise conv.
+    # TF needs equal H/W strides there, and no stride with dilation.
+    # Dilated depthwise is done with space_to_batch, which only handles
+    # channel last input. The stock CPU kernel is NHWC only, so NCHW
+    # depthwise is left to CUDA.
+    depthwise = (not transpose and spatial_size == 2 and group != 1 and
+                 group == x_shape[1] and w_shape[1] == 1 and
+                 strides[0] == strides[1] and
+                 not (dilated and strided) and
+                 (not dilated or compute_c_idx == x_rank - 1) and
+                 (compute_c_idx == x_rank - 1 or support_cuda))
+    if depthwise:
+      # (KH x KW x 1 x C*multiplier) to (KH x KW x C x multiplier)
+      weights = cls._transpose_weights(
+          in_weights, perm, kernel_shape + [group, w_shape[0] // group])
+    else:
+      weights = cls._transpose_weights(in_weights, perm)
 
     pads = node.attrs.get("pads", [0, 0] * spatial_size)
+    auto_pad = node.attrs.get("auto_pad", "NOTSET")
 
     # Check auto_pad nonexistent or NOTSET first
-    if "auto_pad" not in node.attrs or node.attrs["auto_pad"] == "NOTSET":
+    if auto_pad == "NOTSET":
       if not transpose:
-        if pads != [0, 0] * spatial_size:
+        if any(pads):
           x = PadMixin.get_padding_as_op(x, pads)
         pad_mode = "VALID"
       else:
         pad_mode = "NOTSET"
     # Then we use auto_pad to setup pad_mode
-    elif node.attrs["auto_pad"] == "SAME_UPPER":
+    elif auto_pad == "SAME_UPPER":
       pad_mode = "SAME"
-    elif node.attrs["auto_pad"] == "VALID":
+    elif auto_pad == "VALID":
       pad_mode = "VALID"
-    elif node.attrs["auto_pad"] == "SAME_LOWER":
+    elif auto_pad == "SAME_LOWER":
       if transpose:
         pad_mode = PAD_TF_INCOMPATIBLE
       else:
         pad_mode = "SAME"
     else:
-      raise ValueError("Invalid auto_pad attribute: {}".format(
-          node.attrs["auto_pad"]))
+      raise ValueError("Invalid auto_pad attribute: {}".format(auto_pad))
+
+    # Move the input into compute format once; everything below works on
+    # compute_format tensors and only the final output is moved back.
+    if storage_format != compute_format:
+      x = tf.transpose(
+          x, perm=_perm(storage_format, compute_format))
 
     # Currently auto_pad = SAME_LOWER is not supported
     if pad_mode is PAD_TF_INCOMPATIBLE:
@@ -90,136 +282,89 @@ class ConvMixin(BroadcastMixin):
       else:
         exception.OP_UNSUPPORTED_EXCEPT("Conv with auto_pad `SAME_LOWER`", "Tensorflow")
 
-    group = node.attrs.get("group", 1)
-
-    if (group == 1 ) and not transpose:
-        if ("auto_pad" in node.attrs) and (node.attrs["auto_pad"] == "SAME_LOWER") and (strides != [1,1]) :
-          pad = [1,1]
-          if support_cuda:
-            x = tf.pad(x, [[0,0], [0,0], pad, pad])
-          else:
-            x = tf.pad(x, [[0,0], pad, pad, [0,0]])
-            x = tf.transpose( x, perm=get_perm_from_formats(storage_format, compute_format))
-          pad_mode = "VALID"
-
-        #tf.conv2d(input, filter, strides, padding, use_cudnn_on_gpu=True, data_format='NHWC', name=None)
-        #tf.convolution(input, filter, padding, strides=None, dilation_rate=None, name=None, data_format=None)
-        output = tf.nn.convolution( x, weights, pad_mode,
-                            strides=strides, dilation_rate=dilations, data_format=compute_format)
-
-        if len(node.inputs) == 2:
-          if not support_cuda:
-            output = tf.transpose( output, perm=get_perm_from_formats(compute_format, storage_format))
-        else:
-          bias = input_dict[node.inputs[2]]
-          bias = cls.explicit_broadcast([x, bias], compute_c_idx)
-
-          if support_cuda:
-            output = tf.add(output, bias)
-          else:
-            output = tf.add(output, bias)
-            output = tf.transpose(
-                output, perm=get_perm_from_formats(compute_format, storage_format))
-
-        return [output]
+    bias = input_dict[node.inputs[2]] if len(node.inputs) == 3 else None
 
-    weight_groups = tf.split(weights, num_or_size_splits=group, axis=-1)
+    # TF has no SAME_LOWER, pad the whole input once before any group split.
+    if not transpose and auto_pad == "SAME_LOWER":
+      x, padded = cls._pad_same_lower(x, x_shape[2:], spatial_axes,
+                                      kernel_shape, strides, dilations)
+      if padded:
+        pad_mode = "VALID"
 
-    if support_cuda:
-      xs = tf.split(x, num_or_size_splits=group, axis=1)
+    # Grouped 2D conv runs as one conv2d when TF supports it: the filter
+    # layout (KH x KW x C/group x M) is already what TF expects. Never taken
+    # on Tensorflow 1.x, see GROUPED_CONV2D_SUPPORTED.
+    native_group = (group != 1 and spatial_size == 2 and
+                    (support_cuda or ONEDNN_ENABLED) and
+                    GROUPED_CONV2D_SUPPORTED)
+
+    # Pick the conv variant once: a single convolution op, per-group
+    # convolutions joined on the channel axis, or transposed convolution.
+    if depthwise:
+      strides_full = _full_rank(tuple(strides), compute_c_idx)
+      # Tensorflow 1.x names depthwise dilations `rate`.
+      dilation_kwarg = "dilations" if _TF_VERSION >= (2, 0) else "rate"
+      output = tf.nn.depthwise_conv2d(x, weights, strides_full, pad_mode,
+                                      data_format=compute_format,
+                                      **{dilation_kwarg: dilations})
+    elif (group == 1 or native_group) and not transpose:
+      #tf.conv2d(input, filter, strides, padding, use_cudnn_on_gpu=True, data_format='NHWC', name=None)
+      #tf.convolution(input, filter, padding, strides=None, dilation_rate=None, name=None, data_format=None)
+      if group == 1:
+        output = cls._convolution(x, weights, pad_mode, strides, dilations,
+                                  compute_format)
+      else:
+        strides_full = _full_rank(tuple(strides), compute_c_idx)
+        dilations_full = _full_rank(tuple(dilations), compute_c_idx)
+        output = tf.nn.conv2d(x, weights, strides_full, pad_mode,
+                              data_format=compute_format,
+                              dilations=dilations_full)
     else:
-      x = tf.transpose(
-          x, perm=get_perm_from_formats(storage_format, compute_format))
-      xs = tf.split(x, num_or_size_splits=group, axis=-1)
+      if group == 1:
+        weight_groups = [weights]
+        xs = [x]
+      else:
+        weight_groups = tf.split(weights, num_or_size_splits=group, axis=-1)
+        xs = tf.split(x, num_or_size_splits=group, axis=compute_c_idx)
 
-    convolved = []
-    if transpose:
-      if dilations != [1] * spatial_size:
-        raise RuntimeError("Cannot set non-1 dilation for conv transpose.")
       convolved = []
-      for (x, weight) in zip(xs, weight_groups):
-        x_spatial_shape = [
-            x_shape[storage_format.find(d)] for d in spatial_format
-        ]
-        weights_shape = weights.get_shape().as_list()
+      if transpose:
+        if dilated:
+          raise RuntimeError("Cannot set non-1 dilation for conv transpose.")
+
+        # get corresponding function in tf, with strides to match input rank
+        strides_full = _full_rank(tuple(strides), compute_c_idx)
+        if spatial_size == 1:
+          conv_func = tf.contrib.nn.conv1d_transpose
+          strides_full = strides[0]
+        elif spatial_size == 2:
+          conv_func = tf.nn.conv2d_transpose
+        elif spatial_size == 3:
+          conv_func = tf.nn.conv3d_transpose
+        else:
+          raise NotImplementedError(
+              "Transposed convolution for {}d is not implemented in Tensorflow".
+              format(spatial_size))
+
+        weights_shape = [w_shape[i] for i in perm]
+        # Storage format is always channel first (N, C, spatial...).
+        x_spatial_shape = x_shape[2:]
         output_shape = node.attrs.get("output_shape", None)
-        conv_output_shape = [x_shape[storage_format.find("N")]]
 
-        # calculate output shape
+        # calculate output shape, the same for every group
         if pad_mode == "NOTSET":
           if output_shape is None:
-            conv_output_shape += [
+            conv_output_shape = [
                 strides[i] * x_spatial_shape[i] - strides[i] +
                 (kernel_shape[i] - 1) * dilations[i] + 1
                 for i in list(range(spatial_size))
             ]
           else:
-            conv_output_shape += [
+            conv_output_shape = [
                 s + pads[i] + pads[spatial_size + i]
                 for i, s in enumerate(output_shape[-2:])
             ]
-          conv_output_shape.insert(compute_c_idx, weights_shape[-2])
-
-          def handle_dynamic_batch_size(output_shape, batch_idx):
-            output_shape[batch_idx] = tf.shape(x)[batch_idx]
-            return tf.stack(output_shape)
-
-          # process dynamic batch size
-          if conv_output_shape[storage_format.find("N")] is None:
-            batch_idx = storage_format.find("N")
-            conv_output_shape = handle_dynamic_batch_size(conv_output_shape,
-                    batch_idx)
-
-          # make strides to match input rank
-          strides_full = [1] + strides
-          strides_full.insert(compute_c_idx, 1)
-
-          # get corresponding function in tf
-          if spatial_size == 1:
-            conv_func = tf.contrib.nn.conv1d_transpose
-            strides_full = strides[0]
-          elif spatial_size == 2:
-            conv_func = tf.nn.conv2d_transpose
-          elif spatial_size == 3:
-            conv_func = tf.nn.conv3d_transpose
-          else:
-            raise NotImplementedError(
-                "Transposed convolution for {}d is not implemented in Tensorflow".
-                format(spatial_size))
-
-          # use raw input x to do transposed conv
-          conv_rs = conv_func(
-              x,
-              weight,
-              conv_output_shape,
-              strides_full,
-              padding="VALID",
-              data_format=compute_format)
-
-          # pad output first by output_padding attr
-          if "output_padding" in node.attrs and output_shape is None:
-            output_padding = [[0, 0]] + [[0, p] for p in node.attrs["output_padding"]]
-            output_padding.insert(compute_c_idx, [0, 0])
-            conv_rs = tf.pad(conv_rs, output_padding)
-
-          # remove pads set in pads attr
-          conv_rs_shape = conv_rs.get_shape().as_list()
-          begin = [0] + pads[:spatial_size]
-          begin.insert(compute_c_idx, 0)
-          size = [
-              s if d in ["N", "C"] else s - pads[spatial_format.find(d)] -
-              pads[spatial_format.find(d) + spatial_size]
-              for d, s in zip(compute_format, conv_rs_shape)
-          ]
-
-          # process dynamic batch size
-          if size[compute_format.find("N")] is None:
-            batch_idx = compute_format.find("N")
-            size = handle_dynamic_batch_size(size, batch_idx)
-
-          conv_rs = tf.slice(conv_rs, begin=begin, size=size)
-
-          convolved.append(conv_rs)
+          conv_pad_mode = "VALID"
         else:
           # No need to check pads if auto_pad is specifically provided.
           # The assumption is that once auto_pad is provided as either VALID
@@ -227,91 +372,90 @@ class ConvMixin(BroadcastMixin):
           # output_shape will always be inferred. That is, the output_shape
           # and output_padding will not be used in this case.
           if pad_mode == "VALID":
-            conv_output_shape += [
+            conv_output_shape = [
                 strides[i] * (x_spatial_shape[i] - 1) + weights_shape[i]
                 for i in list(range(spatial_size))
             ]
           else:
-            conv_output_shape += [
+            conv_output_shape = [
                 strides[i] * x_spatial_shape[i]
                 for i in list(range(spatial_size))
             ]
-          conv_output_shape.insert(compute_c_idx, weights_shape[-2])
-
-          # process dynamic batch size
-          if conv_output_shape[storage_format.find("N")] is None:
-            batch_idx = storage_format.find("N")
-            conv_output_shape = handle_dynamic_batch_size(conv_output_shape,
-                    batch_idx)
-
-          # make strides to match input rank
-          strides_full = [1] + strides
-          strides_full.insert(compute_c_idx, 1)
-
-          # get corresponding function in tf
-          if spatial_size == 1:
-            conv_func = tf.contrib.nn.conv1d_transpose
-            strides_full = strides[0]
-          elif spatial_size == 2:
-            conv_func = tf.nn.conv2d_transpose
-          elif spatial_size == 3:
-            conv_func = tf.nn.conv3d_transpose
-          else:
-            raise NotImplementedError(
-                "Transposed convolution for {}d is not implemented in Tensorflow".
-                format(spatial_size))
+          conv_pad_mode = pad_mode
+        conv_output_shape.insert(0, x_shape[0])
+        conv_output_shape.insert(compute_c_idx, weights_shape[-2])
+
+        # process dynamic batch size, batch is axis 0 in both storage and
+        # compute formats
+        if x_shape[0] is None:
+          conv_output_shape[0] = tf.shape(x)[0]
+          conv_output_shape = tf.stack(conv_output_shape)
+        else:
+          conv_output_shape = tuple(conv_output_shape)
 
+        if pad_mode == "NOTSET":
+          # pad output first by output_padding attr
+          output_padding = None
+          if "output_padding" in node.attrs and output_shape is None:
+            output_padding = [[0, 0]] + [
+                [0, p] for p in node.attrs["output_padding"]
+            ]
+            output_padding.insert(compute_c_idx, [0, 0])
+          # then remove pads set in pads attr
+          begin = [0] + pads[:spatial_size]
+          begin.insert(compute_c_idx, 0)
+
+        for (x, weight) in zip(xs, weight_groups):
           # use raw input x to do transposed conv
           conv_rs = conv_func(
               x,
               weight,
               conv_output_shape,
               strides_full,
-              padding=pad_mode,
+              padding=conv_pad_mode,
               data_format=compute_format)
-          convolved.append(conv_rs)
 
-    else:
-      # FIXME: 修改支持 "SAME_LOWER" 模式
-      #self.prev_layer = keras.layers.ZeroPadding2D(((1,0),(1,0)))(self.prev_layer)
-      if True:
-        if ("auto_pad" in node.attrs) and (node.attrs["auto_pad"] == "SAME_LOWER") and (strides != [1,1]) :
-          pad = [1,1]
-          if support_cuda:
-            xs = [tf.pad(x, [[0,0], [0,0], pad, pad]) for x in xs]
-          else:
-            xs = [tf.pad(x, [[0,0], pad, pad, [0,0]]) for x in xs]
-          pad_mode = "VALID"
+          if pad_mode == "NOTSET":
+            if output_padding is not None:
+              conv_rs = tf.pad(conv_rs, output_padding)
 
-      convolved = [
-          tf.nn.convolution(
-              x,
-              weight,
-              pad_mode,
-              strides=strides,
-              dilation_rate=dilations,
-              data_format=compute_format)
-          for (x, weight) in zip(xs, weight_groups)
-      ]
+            size = conv_rs.get_shape().as_list()
+            for i, axis in enumerate(spatial_axes):
+              size[axis] -= pads[i] + pads[i + spatial_size]
+            # process dynamic batch size, -1 keeps the whole batch axis
+            if size[0] is None:
+              size[0] = -1
+            conv_rs = tf.slice(conv_rs, begin=begin, size=size)
+
+          convolved.append(conv_rs)
 
-    if len(node.inputs) == 2:
-      if support_cuda:
-        output = tf.concat(convolved, axis=1)
       else:
-        output = tf.concat(convolved, axis=-1)
-        output = tf.transpose(
-            output, perm=get_perm_from_formats(compute_format, storage_format))
-    else:
-      bias = input_dict[node.inputs[2]]
-      bias = cls.explicit_broadcast([x, bias], compute_c_idx)
+        convolved = [
+            cls._convolution(x, weight, pad_mode, strides, dilations,
+                             compute_format)
+            for (x, weight) in zip(xs, weight_groups)
+        ]
 
-      if support_cuda:
-        output = tf.concat(convolved, axis=1)
-        output = tf.add(output, bias)
+      # Each group owns a disjoint channel slice, a single concat along the
+      # channel axis is the only copy; there is nothing to join for group 1.
+      # Bias is added per group before the concat, so it can fuse with
+      # each group's conv instead of taking another pass over the output.
+      if len(convolved) == 1:
+        output = convolved[0]
       else:
-        output = tf.concat(convolved, axis=-1)
-        output = tf.add(output, bias)
-        output = tf.transpose(
-            output, perm=get_perm_from_formats(compute_format, storage_format))
+        if bias is not None:
+          bias_groups = tf.split(bias, num_or_size_splits=group, axis=0)
+          convolved = [
+              cls._add_bias(conv_rs, bias_group, compute_format)
+              for (conv_rs, bias_group) in zip(convolved, bias_groups)
+          ]
+          bias = None
+        output = tf.concat(convolved, axis=compute_c_idx)
+
+    if bias is not None:
+      output = cls._add_bias(output, bias, compute_format)
 
+    if storage_format != compute_format:
+      output = tf.transpose(
+          output, perm=_perm(compute_format, storage_format))
     return [output]